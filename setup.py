@@ -17,7 +17,6 @@ setup(
     },
     install_requires=[
         'SpreadFlowCore',
-        'graphviz',
     ],
     zip_safe=True,
     classifiers=[
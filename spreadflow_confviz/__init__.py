@@ -3,9 +3,19 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-import argparse
+import collections
+import errno
+import functools
+import hashlib
+import itertools
 import os
+import pickle
+import re
+import subprocess
 import sys
+import tempfile
+import traceback
+import weakref
 
 from spreadflow_core.config import config_eval
 from spreadflow_core.dsl.parser import \
@@ -25,11 +35,248 @@ from spreadflow_core.dsl.stream import \
     token_map
 from spreadflow_core.dsl.tokens import \
     ConnectionToken, \
+    DescriptionToken, \
+    LabelToken, \
     ParentElementToken, \
     PartitionSelectToken
-from graphviz import Digraph
 from pprint import pformat
 
+_ANGLE_BRACKETS_RE = re.compile(r'^(<+)(.*?)(>+)\Z', re.DOTALL)
+
+# Identifiers which can be used in DOT without quoting, see _dot_quote().
+_DOT_ID_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))\Z')
+_DOT_KEYWORDS = frozenset(['node', 'edge', 'graph', 'digraph', 'subgraph', 'strict'])
+_DOT_HTML_RE = re.compile(r'<.*>\Z', re.DOTALL)
+
+# Config independent strings of live components keyed by id(), see
+# _component_strings().
+_component_strings_map = {}
+
+# Terminates every response written in server mode.
+_SERVER_DELIMITER = '\0'
+
+# Evaluated config files, see _cached_config_eval().
+_config_memo = collections.OrderedDict()
+_CONFIG_MEMO_SIZE = 16
+
+# Names of the modules first imported while evaluating any config file, see
+# _disk_cached_config_eval().
+_config_module_names = set()
+
+def _dot_quote(text):
+    """
+    Returns the given text as a DOT identifier, quoted if necessary.
+
+    Text enclosed in angle brackets is passed through as an HTML string.
+    """
+    if _DOT_HTML_RE.match(text):
+        return text
+    if _DOT_ID_RE.match(text) and text.lower() not in _DOT_KEYWORDS:
+        return text
+    return '"{:s}"'.format(text.replace('"', '\\"'))
+
+def _dot_attr_list(attrs):
+    """
+    Returns a DOT attribute list for the given sequence of name, value pairs.
+    """
+    return ' [{:s}]'.format(' '.join(
+        '{:s}={:s}'.format(name, _dot_quote(value)) for name, value in attrs))
+
+def _component_strings(node):
+    """
+    Returns a dict caching strings of the given component which do not depend
+    on the config, e.g. its DOT identifier or its fallback label.
+
+    The dict is kept as long as the component is alive. Components are
+    identified by id(), components which compare equal still get separate
+    entries. Objects which cannot be weakly referenced get a fresh dict on
+    every call.
+    """
+    key = id(node)
+    entry = _component_strings_map.get(key)
+    if entry is not None and entry[0]() is node:
+        return entry[1]
+
+    strings = {}
+    try:
+        ref = weakref.ref(node, functools.partial(_forget_component_strings, key))
+    except TypeError:
+        return strings
+
+    _component_strings_map[key] = (ref, strings)
+    return strings
+
+def _forget_component_strings(key, ref):
+    """
+    Drops the cached strings of a component once it got garbage collected.
+    """
+    entry = _component_strings_map.get(key)
+    if entry is not None and entry[0] is ref:
+        del _component_strings_map[key]
+
+def _cache_dir():
+    """
+    Returns the directory used to store evaluated config files.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'spreadflow-confviz')
+
+def _cached_config_eval(path):
+    """
+    Evaluates the config file at the given path and returns the resulting
+    stream as a list.
+
+    Streams of recently used config files are kept in memory keyed by path,
+    modification time and the SHA-1 of the file contents, such that repeated
+    renders in server mode reuse them. Otherwise the result is loaded from or
+    stored into the on-disk cache, see _disk_cached_config_eval().
+    """
+    mtime = os.path.getmtime(path)
+    with open(path, 'rb') as stream_file:
+        digest = hashlib.sha1(stream_file.read()).hexdigest()
+    memo_key = (os.path.abspath(path), mtime, digest)
+
+    try:
+        stream = _config_memo.pop(memo_key)
+    except KeyError:
+        stream = _disk_cached_config_eval(path, mtime, digest)
+
+    # (Re)insert as the most recently used entry and evict the oldest ones.
+    _config_memo[memo_key] = stream
+    while len(_config_memo) > _CONFIG_MEMO_SIZE:
+        _config_memo.popitem(last=False)
+
+    # Callers are free to modify the returned list.
+    return list(stream)
+
+def _disk_cached_config_eval(path, mtime, digest):
+    """
+    Evaluates the config file at the given path and returns the resulting
+    stream as a list.
+
+    The result is pickled into the cache directory keyed by the absolute path
+    of the config file, the SHA-1 digest of its contents and the Python
+    version. A cached stream is reused as long as neither the modification
+    time of the config file nor the one of any module imported while
+    evaluating config files changed. Streams which cannot be pickled are
+    remembered as such and simply evaluated on every run.
+    """
+    key = repr((os.path.abspath(path), digest, tuple(sys.version_info[:2])))
+    cache_path = os.path.join(_cache_dir(),
+                              hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pickle')
+
+    picklable = True
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            cached_mtime, deps, stream = pickle.load(cache_file)
+    except Exception: # pylint: disable=broad-except
+        pass
+    else:
+        if cached_mtime == mtime and _deps_unchanged(deps):
+            if stream is not None:
+                return stream
+            picklable = False
+
+    modules = set(sys.modules)
+    stream = list(config_eval(path))
+    # Modules imported by previously evaluated config files are already
+    # loaded and would go unnoticed otherwise. Extra dependencies only ever
+    # cause needless reevaluation.
+    _config_module_names.update(set(sys.modules) - modules)
+    if not picklable:
+        return stream
+
+    deps = _module_mtimes(sys.modules.get(name) for name in _config_module_names)
+    try:
+        data = pickle.dumps((mtime, deps, stream), pickle.HIGHEST_PROTOCOL)
+    except Exception: # pylint: disable=broad-except
+        data = pickle.dumps((mtime, deps, None), pickle.HIGHEST_PROTOCOL)
+
+    try:
+        if not os.path.isdir(os.path.dirname(cache_path)):
+            os.makedirs(os.path.dirname(cache_path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        try:
+            with os.fdopen(fd, 'wb') as cache_file:
+                cache_file.write(data)
+            try:
+                os.rename(tmp_path, cache_path)
+            except OSError:
+                # Windows refuses to rename onto an existing file.
+                os.unlink(cache_path)
+                os.rename(tmp_path, cache_path)
+        except:
+            os.unlink(tmp_path)
+            raise
+    except Exception: # pylint: disable=broad-except
+        pass
+
+    return stream
+
+def _module_mtimes(modules):
+    """
+    Returns a list of file, modification time pairs of the given modules.
+    Modules without a source file (e.g., builtins) are skipped.
+    """
+    deps = []
+    for module in modules:
+        filename = getattr(module, '__file__', None)
+        if filename and filename.endswith(('.pyc', '.pyo')) and \
+                os.path.exists(filename[:-1]):
+            filename = filename[:-1]
+        if filename:
+            try:
+                deps.append((filename, os.path.getmtime(filename)))
+            except OSError:
+                pass
+    return deps
+
+def _deps_unchanged(deps):
+    """
+    Returns True if none of the files recorded by _module_mtimes() changed.
+    """
+    try:
+        return all(os.path.getmtime(filename) == mtime for filename, mtime in deps)
+    except OSError:
+        return False
+
+def _stream_extract_many(stream, *token_types):
+    """
+    Splits a stream of operations by the type of their tokens in one pass.
+
+    Returns a dict mapping each of the given token types to the list of
+    operations on tokens of that type. Other operations are dropped.
+    """
+    selected = dict((token_type, []) for token_type in token_types)
+    for op in stream:
+        for token_type in token_types:
+            if isinstance(op.token, token_type):
+                selected[token_type].append(op)
+                break
+
+    return selected
+
+def _cluster_lines(clusters):
+    """
+    Yields the indented DOT lines of the given clusters.
+
+    A cluster is a list starting with the subgraph header line, followed by
+    statements and nested child clusters.
+    """
+    stack = [iter(clusters)]
+    while stack:
+        for item in stack[-1]:
+            if isinstance(item, list):
+                yield '\t' * len(stack) + item[0]
+                stack.append(itertools.islice(item, 1, None))
+                break
+            yield '\t' * len(stack) + item
+        else:
+            stack.pop()
+            if stack:
+                yield '\t' * len(stack) + '}'
+
 class DepthReductionPass(object):
 
     connection_parser = ConnectionParser()
@@ -38,34 +285,88 @@ class DepthReductionPass(object):
     def __init__(self, maxdepth):
         self.maxdepth = maxdepth
 
+        # Collapsing everything into the roots does not require any depth
+        # tracking.
+        if maxdepth == 0:
+            self._collapse = self._collapse_roots
+        else:
+            self._collapse = self._collapse_depth
+
     def __call__(self, stream):
         stream = self.connection_parser.divert(stream)
         stream = self.parent_parser.divert(stream)
         for op in stream: yield op
+        stream = None
+
+        # The upstream is fully consumed at this point. Analyze the diverted
+        # tokens eagerly, such that the intermediate maps are released before
+        # the reduced tokens are handed downstream.
+        for op in self._reduce(): yield op
+
+    def _reduce(self):
+        """
+        Returns a list of operations adding the parent and connection tokens
+        of the depth reduced graph.
+        """
+        node_repl, ops = self._collapse()
+
+        seen = set()
+        for port_out, port_in in self.connection_parser.get_links():
+            repl_port_out = node_repl.get(id(port_out), port_out)
+            repl_port_in = node_repl.get(id(port_in), port_in)
+            if repl_port_out is not repl_port_in:
+                # Deduplicate on object identity, cheaper than hashing a token.
+                key = (id(repl_port_out), id(repl_port_in))
+                if key not in seen:
+                    seen.add(key)
+                    ops.append(AddTokenOp(ConnectionToken(repl_port_out, repl_port_in)))
+
+        return ops
 
+    def _collapse_depth(self):
+        """
+        Returns a map from node ids to the ancestor at the maximum depth
+        replacing them and a list of operations adding the remaining parent
+        tokens.
+        """
+        # Both maps are keyed by id(), as are all component maps in this
+        # module. Component objects might implement expensive __hash__ and
+        # __eq__ methods.
         node_depth = {}
         node_repl = {}
+        ops = []
         for node, parent in self.parent_parser.get_parentmap_toposort():
-            depth = 0 if parent is None else node_depth[parent] + 1
-            node_depth[node] = depth
+            if id(parent) in node_repl:
+                # Below the maximum depth, no need to track the depth anymore.
+                # Just collapse the node into the same replacement as its
+                # parent, which always is the ancestor at the maximum depth.
+                node_repl[id(node)] = node_repl[id(parent)]
+                continue
+
+            depth = 0 if parent is None else node_depth[id(parent)] + 1
+            if depth < self.maxdepth:
+                node_depth[id(node)] = depth
+            else:
+                node_repl[id(node)] = node
 
-            if depth == self.maxdepth:
-                node_repl[node] = node
-            elif depth > self.maxdepth:
-                node_repl[node] = node_repl[parent]
+            if depth > 0:
+                ops.append(AddTokenOp(ParentElementToken(node, parent)))
 
-            if depth > 0 and depth <= self.maxdepth:
-                yield AddTokenOp(ParentElementToken(node, parent))
+        return node_repl, ops
 
-        seen = set()
-        for port_out, port_in in self.connection_parser.get_links():
-            repl_port_out = node_repl.get(port_out, port_out)
-            repl_port_in = node_repl.get(port_in, port_in)
-            if repl_port_out is not repl_port_in:
-                token = ConnectionToken(repl_port_out, repl_port_in)
-                if not token in seen:
-                    seen.add(token)
-                    yield AddTokenOp(token)
+    def _collapse_roots(self):
+        """
+        Specialization of _collapse_depth() for a maximum depth of zero. Every
+        node is replaced by its root and no parent tokens remain.
+        """
+        node_repl = {}
+        for node, parent in self.parent_parser.get_parentmap_toposort():
+            if parent is None:
+                node_repl[id(node)] = node
+            else:
+                node_repl[id(node)] = node_repl[id(parent)]
+
+        return node_repl, []
 
 class DepthReducedConnectionParser(ConnectionParser):
     """
@@ -87,24 +388,123 @@ class ConfvizCommand(object):
     level = 1
     multiprocess = False
     partition = None
+    cache = True
+    server = False
 
-    connection_parser = DepthReducedConnectionParser()
     description_parser = DescriptionParser()
     label_parser = LabelParser()
     links_parser = DepthReducedConnectionParser()
     parent_parser = ParentParser()
 
-    def __init__(self, out=sys.stdout):
+    def __init__(self, out=sys.stdout, inp=sys.stdin):
         self._out = out
+        self._inp = inp
 
     def _strip_angle_brackets(self, text):
-        while text.startswith('<') and text.endswith('>'):
-            text = text[1:-1]
-        return text
+        match = _ANGLE_BRACKETS_RE.match(text)
+        if not match:
+            return text
+        n = min(len(match.group(1)), len(match.group(3)))
+        return text[n:-n]
+
+    def _label_for(self, node, labels, strings):
+        if id(node) in labels:
+            return labels[id(node)]
+        label = strings.get('label')
+        if label is None:
+            label = self._strip_angle_brackets(str(node))
+            strings['label'] = label
+        return label
+
+    def _tooltip_for(self, node, descriptions, strings):
+        # Only format the instance dict if there is no description, pformat()
+        # is expensive.
+        if id(node) in descriptions:
+            return descriptions[id(node)]
+        tooltip = strings.get('tooltip')
+        if tooltip is None:
+            if hasattr(node, '__dict__'):
+                tooltip = repr(node) + "\n" + pformat(vars(node))
+            else:
+                tooltip = ''
+            strings['tooltip'] = tooltip
+        return tooltip
+
+    def _meta_for(self, node, labels, descriptions):
+        """
+        Returns the DOT identifier, the label and the tooltip of a node.
+
+        Labels and descriptions given by the config are looked up on every
+        run. The identifier and the fallback strings derived from the node
+        itself are remembered as long as the node is alive, such that they
+        are only computed once, even when rendered repeatedly in server mode.
+        """
+        strings = _component_strings(node)
+        node_id = strings.get('id')
+        if node_id is None:
+            node_id = str(hash(node))
+            strings['id'] = node_id
+
+        return (node_id, self._label_for(node, labels, strings),
+                self._tooltip_for(node, descriptions, strings))
 
     def run(self, args):
+        if not self._parse_args_fast(args):
+            self._parse_args(args)
+
+        if self.server:
+            return self._serve()
+
+        return self._render(self._build_source())
+
+    def _parse_args_fast(self, args):
+        """
+        Parses common command lines without setting up argparse.
+
+        Only options in their plain spelling are recognized (e.g., "-l 2" but
+        neither "-l2" nor "--level=2"). Returns False without changing any
+        attribute if anything else is encountered, argparse takes over in
+        that case and also takes care of help and error messages.
+        """
+        values = {}
+        remaining = iter(args[1:])
+        for arg in remaining:
+            if arg in ('-l', '--level', '--partition'):
+                value = next(remaining, None)
+                if value is None or value.startswith('-'):
+                    return False
+                if arg == '--partition':
+                    values['partition'] = value
+                else:
+                    try:
+                        values['level'] = int(value)
+                    except ValueError:
+                        return False
+            elif arg in ('-p', '--multiprocess'):
+                values['multiprocess'] = True
+            elif arg == '--no-cache':
+                values['cache'] = False
+            elif arg == '--server':
+                values['server'] = True
+            elif arg.startswith('-') or 'path' in values:
+                return False
+            else:
+                values['path'] = arg
+
+        if 'path' not in values and 'server' not in values:
+            return False
+
+        for name, value in values.items():
+            setattr(self, name, value)
+
+        return True
+
+    def _parse_args(self, args):
+        # Imported here, argparse is only needed for unusual command lines.
+        import argparse
+
         parser = argparse.ArgumentParser(prog=args[0])
-        parser.add_argument('path', metavar='FILE',
+        parser.add_argument('path', metavar='FILE', nargs='?',
                             help='Path to config file')
         parser.add_argument('-l', '--level', type=int,
                             help='Level of detail (0: toplevel components, default: 1)')
@@ -112,10 +512,107 @@ class ConfvizCommand(object):
                             help='Simulates multiprocess support, i.e., launch a separate process for each chain')
         parser.add_argument('--partition',
                             help='Simulates multiprocess support, select the given partition of the graph')
+        parser.add_argument('--no-cache', dest='cache', action='store_false',
+                            help='Always evaluate the config file, do not use cached results')
+        parser.add_argument('--server', action='store_true',
+                            help='Read config file paths from stdin, one per line and optionally followed by a tab and a partition, and write one SVG per line to stdout, each terminated by a NUL character (empty on failure)')
 
         parser.parse_args(args[1:], namespace=self)
 
-        stream = config_eval(self.path)
+        if self.path is None and not self.server:
+            parser.error('the following arguments are required: FILE')
+
+    def _serve(self):
+        """
+        Renders the config file of every line read from the input.
+
+        A line may select a partition by appending it to the path, separated
+        by a tab. Otherwise the partition given on the command line is used.
+        Rendering a partition still requires --multiprocess. Partitions of
+        the same config share the evaluated config file and the cached
+        component strings.
+
+        Exactly one response is written per input line, terminated by a NUL
+        character. The response is empty if the config could not be rendered,
+        details are reported on stderr then. Returns 1 if any of the renders
+        failed, 0 otherwise.
+        """
+        status = 0
+        default_partition = self.partition
+
+        # Use readline() instead of iterating the file, the latter reads ahead
+        # on Python 2 and would block until the input buffer is filled.
+        for line in iter(self._inp.readline, ''):
+            path, _, partition = line.partition('\t')
+            self.path = path.strip()
+            self.partition = partition.strip() or default_partition
+
+            try:
+                if not self.path:
+                    raise ValueError('empty config file path')
+                returncode = self._render(self._build_source(), direct=False)
+            except Exception: # pylint: disable=broad-except
+                traceback.print_exc()
+                returncode = 1
+
+            if returncode != 0:
+                status = 1
+
+            self._out.write(_SERVER_DELIMITER)
+            self._out.flush()
+
+        return status
+
+    def _render(self, source, direct=True):
+        """
+        Renders the given DOT source to SVG and returns the exit status of dot.
+
+        If direct is set and the output file has a file descriptor, the output
+        of dot is written straight to it and the SVG is not buffered in
+        memory. Otherwise the SVG is only written if dot succeeded.
+        """
+        out = getattr(self._out, 'buffer', self._out)
+        fileno = None
+        if direct:
+            try:
+                fileno = out.fileno()
+            except (AttributeError, ValueError):
+                pass
+
+        # Preserve the order of anything written to the output before. Text
+        # still pending in a wrapper has to be pushed to the binary buffer
+        # first.
+        self._out.flush()
+        out.flush()
+
+        try:
+            proc = subprocess.Popen(
+                ['dot', '-Tsvg'], stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE if fileno is None else fileno)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                raise RuntimeError('failed to execute dot, make sure the '
+                                   'Graphviz executables are on your PATH')
+            raise
+
+        svg, _ = proc.communicate(source.encode('utf-8'))
+        if fileno is None and proc.returncode == 0:
+            # Write the bytes as is, the SVG declares its own encoding. Only
+            # text streams without a binary buffer (e.g., io.StringIO) get
+            # the decoded SVG.
+            try:
+                out.write(svg)
+            except TypeError:
+                out.write(svg.decode('utf-8'))
+            out.flush()
+
+        return proc.returncode
+
+    def _build_source(self):
+        if self.cache:
+            stream = _cached_config_eval(self.path)
+        else:
+            stream = list(config_eval(self.path))
 
         pipeline = list()
         pipeline.append(AliasResolverPass())
@@ -134,62 +631,94 @@ class ConfvizCommand(object):
         pipeline.append(ComponentsPurgePass())
         pipeline.append(DepthReductionPass(self.level))
 
-        for compiler_step in pipeline:
-            stream = compiler_step(stream)
-
-        stream = self.connection_parser.extract(stream)
-        stream = self.description_parser.extract(stream)
-        stream = self.label_parser.extract(stream)
-        stream = self.links_parser.extract(stream)
-        stream = self.parent_parser.extract(stream)
-
-        labels = self.label_parser.get_labelmap()
-        descriptions = self.description_parser.get_descriptionmap()
-        ports = self.connection_parser.get_portset()
-
-        dg = Digraph(os.path.basename(self.path), engine='dot')
+        # Chain the passes, each one consuming the output of its predecessor.
+        stream = functools.reduce(lambda s, step: step(s), pipeline, stream)
+
+        selected = _stream_extract_many(stream, DescriptionToken, LabelToken,
+                                        ConnectionToken, ParentElementToken)
+        self.description_parser.extract(selected[DescriptionToken])
+        self.label_parser.extract(selected[LabelToken])
+        self.links_parser.extract(selected[ConnectionToken])
+        self.parent_parser.extract(selected[ParentElementToken])
+
+        # Component objects live until the end of the run, their ids are
+        # unique until then.
+        labels = dict((id(node), label) for node, label
+                      in self.label_parser.get_labelmap().items())
+        descriptions = dict((id(node), description) for node, description
+                            in self.description_parser.get_descriptionmap().items())
+
+        # Collect the connected ports while walking the links.
+        links = []
+        ports = {}
+        for src, sink in self.links_parser.get_links():
+            links.append((src, sink))
+            ports[id(src)] = src
+            ports[id(sink)] = sink
+
+        parentmap = list(self.parent_parser.get_parentmap_toposort(reverse=True))
+
+        # Node identifiers, labels and tooltips. A parent appears once for
+        # each of its children, visit it only once.
+        meta = {}
+        for n in itertools.chain(ports.values(), (
+                parent for _, parent in parentmap if parent is not None)):
+            if id(n) not in meta:
+                meta[id(n)] = self._meta_for(n, labels, descriptions)
+
+        # The DOT source is assembled from plain lines of text, bypassing the
+        # per-call overhead of an object model.
+        quote = _dot_quote
+        attr_list = _dot_attr_list
+
+        def port_statement(port):
+            node_id, label, tooltip = meta[id(port)]
+            return '{:s}{:s}'.format(
+                quote(node_id), attr_list([('label', label), ('tooltip', tooltip)]))
 
         # Walk the component trees from leaves to roots and build clusters.
-        subgraphs = {}
-        for child, parent in self.parent_parser.get_parentmap_toposort(reverse=True):
+        # Ports are declared including their label and tooltip right where
+        # they are placed. Child clusters are nested into their parent by
+        # reference, the DOT lines are only indented and emitted once in the
+        # end.
+        clusters = {}
+        unplaced = dict(ports)
+        for child, parent in parentmap:
             if parent is not None:
-                try:
-                    sg = subgraphs[parent]
-                except KeyError:
-                    sg = Digraph('cluster_{:s}'.format(str(hash(parent))))
-                    label = labels.get(parent, self._strip_angle_brackets(str(parent)))
-                    tooltip = descriptions.get(parent, repr(parent) + "\n" + pformat(vars(parent)))
-                    sg.attr('graph', label=label, tooltip=tooltip, color="blue")
-                    subgraphs[parent] = sg
-
-                if child in subgraphs:
-                    child_sg = subgraphs.pop(child)
-                    if child in ports:
+                cluster = clusters.get(id(parent))
+                if cluster is None:
+                    parent_id, label, tooltip = meta[id(parent)]
+                    cluster = [
+                        'subgraph {:s} {{'.format(quote('cluster_' + parent_id)),
+                        'graph{:s}'.format(attr_list([('label', label), ('color', 'blue'), ('tooltip', tooltip)])),
+                    ]
+                    clusters[id(parent)] = cluster
+
+                if id(child) in clusters:
+                    child_cluster = clusters.pop(id(child))
+                    if id(child) in ports:
                         # Place the port inside its own subgraph if a port is
                         # also the parent of other ports.
-                        child_sg.node(str(hash(child)))
-                    sg.subgraph(child_sg)
-                elif child in ports:
-                    sg.node(str(hash(child)))
+                        child_cluster.append(port_statement(unplaced.pop(id(child))))
+                    cluster.append(child_cluster)
+                elif id(child) in ports:
+                    cluster.append(port_statement(unplaced.pop(id(child))))
 
-        for sg in subgraphs.values():
-            dg.subgraph(sg)
+        lines = ['digraph {:s} {{'.format(quote(os.path.basename(self.path)))]
+        lines.extend(_cluster_lines(clusters.values()))
+
+        # Ports outside of any cluster
+        lines.extend('\t' + port_statement(port) for port in unplaced.values())
 
         # Edges
-        for src, sink in self.links_parser.get_links():
-            dg.edge(str(hash(src)), str(hash(sink)))
+        lines.extend(
+            '\t{:s} -> {:s}'.format(quote(meta[id(src)][0]), quote(meta[id(sink)][0]))
+            for src, sink in links
+        )
 
-        # Tooltips
-        for n in ports:
-            try:
-                tooltip = descriptions.get(n, repr(n) + "\n" + pformat(vars(n)))
-            except TypeError:
-                tooltip = ''
-            label = labels.get(n, self._strip_angle_brackets(str(n)))
-            dg.node(str(hash(n)), label=label, tooltip=tooltip)
+        lines.append('}')
 
-        print(dg.pipe(format='svg'), file=self._out)
-        return 0
+        return '\n'.join(lines)
 
 def main():
     cmd = ConfvizCommand()